@@ -6,15 +6,19 @@ about Nigerian tax law based on the Nigeria Tax Act 2025.
 """
 
 from flask import Flask, request, jsonify, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from werkzeug.http import generate_etag
 from dotenv import load_dotenv
+import orjson
 from pathlib import Path
 import os
 import time
 import logging
 import re
+from collections import OrderedDict
 from functools import wraps
 from typing import Any, Callable, Dict, Optional, Tuple
 
@@ -31,7 +35,23 @@ load_dotenv()
 # App Configuration
 # ============================================================================
 
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, using the stdlib for types orjson rejects."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        option = orjson.OPT_SORT_KEYS if self.sort_keys else 0
+        try:
+            return orjson.dumps(obj, option=option).decode("utf-8")
+        except TypeError:
+            # e.g. Decimal or non-string keys, which the default provider handles
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.config['JSON_SORT_KEYS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 1 * 1024 * 1024  # 1MB max request size
 
@@ -58,7 +78,7 @@ limiter = Limiter(
 
 from src.tax_calculator import calculate_tax, get_tax_summary, TaxCalculationError
 from scripts.query_qa import load_vectorstore, query
-from scripts.qa_service import generate_answer, verify_answer
+from scripts.qa_service import generate_answer, verify_answer, is_greeting, GREETING_RESPONSE
 import threading
 
 # ============================================================================
@@ -66,52 +86,89 @@ import threading
 # ============================================================================
 
 _vectorstore_cache: Optional[Tuple[Any, Any]] = None
-_vectorstore_loading = False
 _vectorstore_lock = threading.Lock()
 
 
 def preload_vectorstore():
     """Preload vectorstore in background thread (embeddings use HF API, no local model)."""
-    global _vectorstore_cache, _vectorstore_loading
-    with _vectorstore_lock:
-        if _vectorstore_cache is None and not _vectorstore_loading:
-            _vectorstore_loading = True
-    
-    if _vectorstore_loading and _vectorstore_cache is None:
-        try:
-            logger.info("Background loading vectorstore...")
-            _vectorstore_cache = load_vectorstore()
-            logger.info("Vectorstore preloaded successfully (using HF API for embeddings)")
-        except Exception as e:
-            logger.error(f"Background preload failed: {e}")
-        finally:
-            _vectorstore_loading = False
+    try:
+        logger.info("Background loading vectorstore...")
+        get_vectorstore()
+        logger.info("Vectorstore preloaded successfully (using HF API for embeddings)")
+    except Exception as e:
+        logger.error(f"Background preload failed: {e}")
 
 
 def get_vectorstore() -> Tuple[Any, Any]:
     """Load and cache vectorstore with thread-safe initialization."""
     global _vectorstore_cache
+    # Double-checked locking: the fast path is a single None check, and
+    # concurrent callers wait for one load instead of each reading the index
     if _vectorstore_cache is None:
-        logger.info("Loading vectorstore...")
-        try:
-            _vectorstore_cache = load_vectorstore()
-            logger.info("Vectorstore loaded successfully")
-        except Exception as e:
-            logger.error(f"Failed to load vectorstore: {e}")
-            raise
+        with _vectorstore_lock:
+            if _vectorstore_cache is None:
+                logger.info("Loading vectorstore...")
+                try:
+                    _vectorstore_cache = load_vectorstore()
+                    logger.info("Vectorstore loaded successfully")
+                except Exception as e:
+                    logger.error(f"Failed to load vectorstore: {e}")
+                    raise
     return _vectorstore_cache
 
 
+# ============================================================================
+# Answer Cache
+# ============================================================================
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 256))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 3600))  # seconds
+
+_answer_cache: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_answer_cache_lock = threading.Lock()
+
+
+def answer_cache_key(endpoint: str, query_text: str, top_k: int, prefer_grok: bool) -> Tuple:
+    """Build a cache key that ignores case and whitespace differences in the query."""
+    return (endpoint, " ".join(query_text.lower().split()), top_k, prefer_grok)
+
+
+def get_cached_answer(key: Tuple) -> Optional[Dict[str, Any]]:
+    """Return a cached response if present and not expired (LRU order is refreshed)."""
+    with _answer_cache_lock:
+        entry = _answer_cache.get(key)
+        if entry is None:
+            return None
+        cached_at, response = entry
+        if time.time() - cached_at > ANSWER_CACHE_TTL:
+            del _answer_cache[key]
+            return None
+        _answer_cache.move_to_end(key)
+        return response
+
+
+def cache_answer(key: Tuple, response: Dict[str, Any]) -> None:
+    """Store a generated response, evicting the least recently used entry when full."""
+    with _answer_cache_lock:
+        _answer_cache[key] = (time.time(), response)
+        _answer_cache.move_to_end(key)
+        while len(_answer_cache) > ANSWER_CACHE_SIZE:
+            _answer_cache.popitem(last=False)
+
+
 # ============================================================================
 # Input Validation & Security
 # ============================================================================
 
+CONTROL_CHARS_PATTERN = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
+
 def sanitize_string(text: str, max_length: int = 2000) -> str:
     """Sanitize user input string."""
     if not isinstance(text, str):
         return ""
     # Remove null bytes and control characters (except newlines/tabs)
-    text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]', '', text)
+    text = CONTROL_CHARS_PATTERN.sub('', text)
     # Limit length
     return text[:max_length].strip()
 
@@ -229,6 +286,25 @@ def after_request(response):
     return response
 
 
+# Endpoints whose bodies never repeat (health embeds a timestamp), so hashing
+# them for an ETag is wasted work
+NO_ETAG_ENDPOINTS = frozenset({"health"})
+
+
+@app.after_request
+def conditional_get(response):
+    """Add an ETag to GET/HEAD responses and answer a matching If-None-Match with 304."""
+    if (
+        request.method in ("GET", "HEAD")
+        and request.endpoint not in NO_ETAG_ENDPOINTS
+        and response.status_code == 200
+        and not response.direct_passthrough
+    ):
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
 # ============================================================================
 # API Routes
 # ============================================================================
@@ -356,6 +432,22 @@ def qa():
         prefer_grok = bool(payload.get("prefer_grok", True))
         fast_mode = bool(payload.get("fast_mode", False))
         
+        # Greetings need no context - skip retrieval and generation entirely
+        if is_greeting(query_text):
+            return jsonify({
+                "query": query_text,
+                "answer": GREETING_RESPONSE,
+                "model": "none",
+                "sources": []
+            }), 200
+        
+        # Repeated questions skip retrieval and generation entirely (fast mode
+        # never calls the LLM, so it neither reads nor fills the cache)
+        cache_key = answer_cache_key("qa", query_text, top_k, prefer_grok)
+        cached = None if fast_mode else get_cached_answer(cache_key)
+        if cached is not None:
+            return jsonify({**cached, "query": query_text}), 200
+        
         # Retrieve relevant context with timeout handling
         try:
             index, docs = get_vectorstore()
@@ -393,12 +485,14 @@ def qa():
                 "sources": results
             }), 200
         
-        return jsonify({
+        response = {
             "query": query_text,
             "answer": answer,
             "model": model_used,
             "sources": results
-        }), 200
+        }
+        cache_answer(cache_key, response)
+        return jsonify(response), 200
         
     except APIError:
         raise
@@ -414,6 +508,8 @@ def aqa():
     Answer questions with verification (Assured QA).
     
     Same as /qa but includes answer verification step for higher accuracy.
+    Responses are cached in-process (see ANSWER_CACHE_TTL) unless verification
+    fell back, so repeated questions skip retrieval, generation and verification.
     
     Request JSON:
         - query (string, required): Question to answer
@@ -433,6 +529,21 @@ def aqa():
         top_k = validate_positive_int(payload.get("top_k", 5), "top_k", min_val=1, max_val=10)
         prefer_grok = bool(payload.get("prefer_grok", True))
         
+        if is_greeting(query_text):
+            return jsonify({
+                "query": query_text,
+                "answer": GREETING_RESPONSE,
+                "model": "none",
+                "verification": {"score": 0, "reason": "Greeting - nothing to verify"},
+                "verified": False,
+                "sources": []
+            }), 200
+        
+        cache_key = answer_cache_key("aqa", query_text, top_k, prefer_grok)
+        cached = get_cached_answer(cache_key)
+        if cached is not None:
+            return jsonify({**cached, "query": query_text}), 200
+        
         # Retrieve relevant context
         index, docs = get_vectorstore()
         results = query(index, docs, query_text, top_k=top_k)
@@ -452,35 +563,29 @@ def aqa():
         # Verify answer
         try:
             verification = verify_answer(answer, query_text, results, prefer_grok=prefer_grok)
+            # The fallback flag is internal; keep it out of the response
+            verification_unavailable = verification.pop("unavailable", False)
             
-            # Parse verification result
-            verified = False
-            if isinstance(verification, dict):
-                score = verification.get("score", 0)
-                verified = score >= 0.7 if isinstance(score, (int, float)) else False
-            elif isinstance(verification, str):
-                # Try to extract score from string response
-                import json
-                try:
-                    verification = json.loads(verification)
-                    score = verification.get("score", 0)
-                    verified = score >= 0.7 if isinstance(score, (int, float)) else False
-                except json.JSONDecodeError:
-                    verification = {"raw": verification, "score": 0}
-                    verified = "accurate" in verification.get("raw", "").lower()
+            # verify_answer always returns a dict with a float score
+            verified = verification["score"] >= 0.7
         except Exception as ve:
             logger.warning(f"Verification failed: {ve}")
             verification = {"error": "Verification unavailable"}
+            verification_unavailable = True
             verified = False
         
-        return jsonify({
+        response = {
             "query": query_text,
             "answer": answer,
             "model": model_used,
             "verification": verification,
             "verified": verified,
             "sources": results
-        }), 200
+        }
+        # Only cache answers whose verification score came from the model
+        if not verification_unavailable:
+            cache_answer(cache_key, response)
+        return jsonify(response), 200
         
     except APIError:
         raise
@@ -493,23 +598,33 @@ def aqa():
 # API Documentation Endpoint
 # ============================================================================
 
+API_DOCS = {
+    "name": "AI Tax Reform API",
+    "version": "2.0.0",
+    "description": "AI-powered Nigerian tax calculator and Q&A service",
+    "endpoints": {
+        "GET /health": "Health check",
+        "POST /calculate": "Calculate personal income tax",
+        "POST /retrieve": "Retrieve relevant tax documents",
+        "POST /qa": "Ask questions about tax law",
+        "POST /aqa": "Ask questions with answer verification"
+    },
+    "documentation": "https://github.com/your-repo/AI-TAX-REFORM#readme"
+}
+
+# The docs never change at runtime, so serialize them (and their ETag) once,
+# through the same provider path jsonify uses so the bytes match exactly
+API_DOCS_BODY = app.json.response(API_DOCS).get_data()
+API_DOCS_ETAG = generate_etag(API_DOCS_BODY)
+
+
 @app.route("/", methods=["GET"])
 @limiter.exempt
 def api_docs():
     """Return API documentation."""
-    return jsonify({
-        "name": "AI Tax Reform API",
-        "version": "2.0.0",
-        "description": "AI-powered Nigerian tax calculator and Q&A service",
-        "endpoints": {
-            "GET /health": "Health check",
-            "POST /calculate": "Calculate personal income tax",
-            "POST /retrieve": "Retrieve relevant tax documents",
-            "POST /qa": "Ask questions about tax law",
-            "POST /aqa": "Ask questions with answer verification"
-        },
-        "documentation": "https://github.com/your-repo/AI-TAX-REFORM#readme"
-    }), 200
+    response = app.response_class(API_DOCS_BODY, mimetype="application/json")
+    response.set_etag(API_DOCS_ETAG)
+    return response, 200
 
 
 # ============================================================================
@@ -9,11 +9,48 @@ import os
 bind = f"0.0.0.0:{os.getenv('PORT', '7860')}"
 backlog = 2048
 
+
+def available_cpus():
+    """Count CPUs actually available to this process, respecting container limits.
+
+    multiprocessing.cpu_count() reports the host's cores, so a 1-CPU container
+    on a large host would spawn the maximum number of workers.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = multiprocessing.cpu_count()
+
+    # CPU quota: cgroup v2 ("<quota> <period>" or "max <period>"), then v1
+    quota = period = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            raw_quota, raw_period = f.read().split()
+        if raw_quota != "max":
+            quota, period = int(raw_quota), int(raw_period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                raw_quota = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                raw_period = int(f.read())
+            if raw_quota > 0:
+                quota, period = raw_quota, raw_period
+        except (OSError, ValueError):
+            pass
+
+    if quota and period:
+        cpus = min(cpus, max(1, quota // period))
+    return cpus
+
+
 # Worker processes
-workers = int(os.getenv('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 4)))
-worker_class = "sync"
-worker_connections = 1000
-timeout = 120
+workers = int(os.getenv('GUNICORN_WORKERS', min(available_cpus() * 2 + 1, 4)))
+# Threaded workers: requests spend most of their time waiting on LLM APIs,
+# so a worker can serve several at once (Flask is WSGI, so no ASGI workers)
+worker_class = "gthread"
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
 keepalive = 5
 
 # Request handling
@@ -45,10 +82,22 @@ def on_starting(server):
     logger = logging.getLogger(__name__)
     logger.info("Preloading sentence-transformers model...")
     try:
-        from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-        # Warm up with a test encode
-        model.encode(["test"], show_progress_bar=False)
+        import gc
+        # Load through the app's model cache so workers inherit this instance
+        # instead of each loading their own copy on the first request
+        from scripts.query_qa import get_embedding_model
+        get_embedding_model()
+        # Move everything loaded so far out of GC tracking, so collections in
+        # the workers don't touch (and copy-on-write duplicate) the model pages
+        gc.freeze()
         logger.info("Model preloaded successfully")
     except Exception as e:
         logger.error(f"Model preload failed: {e}")
+
+
+def post_fork(server, worker):
+    """Start loading the vectorstore as soon as each worker boots."""
+    # app.py only schedules the preload under __main__, so without this hook
+    # the first request in every gunicorn worker pays the full load cost
+    from app import start_background_tasks
+    start_background_tasks()
@@ -5,6 +5,7 @@ Usage: python scripts/ingest_pdf.py --pdf data/raw/Nigeria-Tax-Act-2025.pdf
 import argparse
 import os
 import pickle
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from dotenv import load_dotenv, dotenv_values
@@ -51,18 +52,18 @@ def embed_text_hf(texts, model_id="nvidia/llama-embed-nemotron-8b", api_token=No
 
 
 # Local embedder using sentence-transformers
-def embed_text_local(texts, model_name="sentence-transformers/all-mpnet-base-v2"):
+def embed_text_local(texts, model_name="sentence-transformers/all-mpnet-base-v2", batch_size=32):
     """Embed texts locally using sentence-transformers."""
     try:
         from sentence_transformers import SentenceTransformer
     except Exception as e:
         raise Exception("Local sentence-transformers not installed. Install it with `pip install sentence-transformers`.")
     model = SentenceTransformer(model_name)
-    embs = model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+    embs = model.encode(texts, batch_size=batch_size, show_progress_bar=True, convert_to_numpy=True)
     return np.array(embs, dtype=np.float32)
 
 
-def main(pdf_path, persist_dir="vectorstore", model_id="sentence-transformers/all-mpnet-base-v2", batch_size=8, api_token=None):
+def main(pdf_path, persist_dir="vectorstore", model_id="sentence-transformers/all-mpnet-base-v2", batch_size=8, api_token=None, max_workers=4, quantize=False):
     pdf_path = Path(pdf_path)
     assert pdf_path.exists(), f"PDF not found: {pdf_path}"
     persist_dir = Path(persist_dir)
@@ -74,10 +75,12 @@ def main(pdf_path, persist_dir="vectorstore", model_id="sentence-transformers/al
         api_token = os.getenv("HF_TOKEN") or env_vars.get("HF_TOKEN")
 
     reader = PdfReader(str(pdf_path))
-    pages = [p.extract_text() or "" for p in reader.pages]
 
+    # Chunk each page as it is extracted; only the chunks are kept, never
+    # the full text of every page at once
     docs = []
-    for i, page_text in enumerate(pages, start=1):
+    for i, page in enumerate(reader.pages, start=1):
+        page_text = page.extract_text() or ""
         for j, chunk in enumerate(chunk_text(page_text)):
             docs.append({
                 "text": chunk.strip(),
@@ -93,33 +96,69 @@ def main(pdf_path, persist_dir="vectorstore", model_id="sentence-transformers/al
     texts = [d["text"] for d in docs]
     print(f"Creating embeddings for {len(texts)} chunks using {model_id}...")
 
-    # Embed in batches to avoid timeout
-    embeddings_list = []
-    for batch_start in tqdm(range(0, len(texts), batch_size)):
-        batch_end = min(batch_start + batch_size, len(texts))
-        batch_texts = texts[batch_start:batch_end]
-            # Use local sentence-transformers if model_id points to sentence-transformers namespace
-        if model_id.startswith("sentence-transformers/"):
-            batch_embs = embed_text_local(batch_texts, model_id)
-        else:
-            batch_embs = embed_text_hf(batch_texts, model_id, api_token)
-        embeddings_list.append(batch_embs)
-
-    embeddings = np.vstack(embeddings_list)
-
-    # Normalize for cosine-similarity via inner product
-    norms = (embeddings**2).sum(axis=1, keepdims=True) ** 0.5
-    norms[norms == 0] = 1.0
-    embeddings = embeddings / norms
+    if model_id.startswith("sentence-transformers/"):
+        # Local model: a single encode call, sentence-transformers batches internally
+        embeddings = embed_text_local(texts, model_id, batch_size=batch_size)
+    else:
+        # HF API calls are network-bound, so send batches concurrently
+        # (small batches avoid timeouts; map() keeps them in order)
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            embeddings_list = list(tqdm(
+                executor.map(lambda batch: embed_text_hf(batch, model_id, api_token), batches),
+                total=len(batches)
+            ))
+        embeddings = np.vstack(embeddings_list)
+
+    # Normalize for cosine-similarity via inner product (in place on a
+    # contiguous float32 matrix, which is also the layout index.add expects;
+    # zero vectors are left as-is)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    faiss.normalize_L2(embeddings)
 
     dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)
+    if quantize:
+        # 8-bit scalar quantization: 4x smaller index, scans read a quarter of the bytes
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+    else:
+        index = faiss.IndexFlatIP(dim)
     index.add(embeddings)
 
-    faiss.write_index(index, str(persist_dir / "faiss_index.bin"))
+    # Write to temp files first and rename into place, so a crash mid-write
+    # never leaves a truncated index or metadata file behind. The two renames
+    # are separate steps; load_vectorstore rejects a mismatched pair.
+    index_path = persist_dir / "faiss_index.bin"
+    meta_path = persist_dir / "metadata.pkl"
+    index_tmp = index_path.with_suffix(".bin.tmp")
+    meta_tmp = meta_path.with_suffix(".pkl.tmp")
 
-    with open(persist_dir / "metadata.pkl", "wb") as f:
-        pickle.dump(docs, f)
+    try:
+        faiss.write_index(index, str(index_tmp))
+        # write_index does not expose its file handle, so fsync the file separately
+        with open(index_tmp, "rb") as f:
+            os.fsync(f.fileno())
+
+        with open(meta_tmp, "wb") as f:
+            pickle.dump(docs, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(index_tmp, index_path)
+        os.replace(meta_tmp, meta_path)
+
+        # fsync the directory so the renames themselves survive a power loss
+        if os.name == "posix":
+            dir_fd = os.open(persist_dir, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+    finally:
+        # Don't leave temp files in the (git-tracked) vectorstore directory
+        for tmp_path in (index_tmp, meta_tmp):
+            if tmp_path.exists():
+                tmp_path.unlink()
 
     print("Vectorstore saved to:", persist_dir)
 
@@ -130,6 +169,8 @@ if __name__ == "__main__":
     parser.add_argument("--persist_dir", default="vectorstore")
     parser.add_argument("--model", default="nvidia/llama-embed-nemotron-8b")
     parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent HF API embedding requests")
+    parser.add_argument("--quantize", action="store_true", help="Store embeddings as 8-bit scalar-quantized codes")
     parser.add_argument("--hf_token", default=None, help="Hugging Face token (overrides HF_TOKEN env/.env)")
     args = parser.parse_args()
-    main(args.pdf, args.persist_dir, args.model, args.batch_size, api_token=args.hf_token)
+    main(args.pdf, args.persist_dir, args.model, args.batch_size, api_token=args.hf_token, max_workers=args.workers, quantize=args.quantize)
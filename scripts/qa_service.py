@@ -6,9 +6,11 @@ questions using Groq and Gemini APIs with retrieval-augmented generation (RAG).
 """
 
 import os
+import re
 import json
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Tuple, Dict, Any, List, Optional
 
 logger = logging.getLogger(__name__)
@@ -20,6 +22,10 @@ GROK_API_URL = os.getenv("GROK_API_URL")  # Backwards compatibility
 GROK_API_KEY = os.getenv("GROK_API_KEY")  # Backwards compatibility
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Shared HTTP session: keeps TCP/TLS connections to the LLM APIs alive across requests
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
 # System prompts
 TAX_ASSISTANT_PROMPT = """You are an expert Nigerian tax consultant assistant with deep knowledge of the Nigeria Tax Act 2025 and related tax legislation.
 
@@ -52,6 +58,58 @@ Return a JSON object with:
 - issues: array of strings listing any inaccuracies or concerns (empty if none)
 """
 
+# User prompt templates (static text is built once; only the fields vary per request)
+ANSWER_PROMPT_TEMPLATE = """Based on the following excerpts from the Nigeria Tax Act 2025, please answer the question.
+
+CONTEXT:
+{context}
+
+QUESTION: {query}
+
+Please provide a clear, accurate answer based ONLY on the information provided above. 
+If the context doesn't contain enough information, clearly state that.
+List the source numbers you used at the end of your response."""
+
+VERIFY_PROMPT_TEMPLATE = """Verify the following answer about Nigerian tax law.
+
+CONTEXT DOCUMENTS:
+{context}
+
+QUESTION: {query}
+
+ANSWER TO VERIFY:
+{answer}
+
+Analyze the answer and return ONLY a valid JSON object (no markdown, no explanation) with these exact fields:
+{{
+    "score": <float 0-1>,
+    "accurate": <boolean>,
+    "confidence_reason": "<string>",
+    "issues": ["<string>", ...]
+}}"""
+
+GREETING_RESPONSE = (
+    "Hello! I'm your Nigerian tax assistant. Ask me anything about the "
+    "Nigeria Tax Act 2025, such as income tax rates, reliefs, or filing "
+    "obligations."
+)
+
+# Exact greetings checked with a set lookup before falling back to the regex
+COMMON_GREETINGS = frozenset({
+    "hi", "hello", "hey", "hiya", "thanks", "thank you", "ok", "okay", "bye"
+})
+
+# Matches messages that are only a greeting/pleasantry (no actual question)
+GREETING_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|hiya|good\s+(morning|afternoon|evening)|greetings|"
+    r"thanks|thank\s+you|ok|okay|bye|goodbye)[\s!.,?]*$",
+    re.IGNORECASE
+)
+
+# Matches a markdown code fence (any language tag, e.g. ```json or ```JSON)
+# wrapped around a JSON reply
+JSON_FENCE_PATTERN = re.compile(r"^```[\w-]*\s*(.*?)\s*```$", re.DOTALL)
+
 
 class APIError(Exception):
     """Custom exception for API errors."""
@@ -64,7 +122,8 @@ def call_groq(
     timeout: int = 25,
     model: str = "llama-3.3-70b-versatile",
     max_tokens: int = 800,
-    temperature: float = 0.3
+    temperature: float = 0.3,
+    json_mode: bool = False
 ) -> str:
     """
     Call Groq API (OpenAI-compatible) for text generation.
@@ -76,6 +135,7 @@ def call_groq(
         model: Model identifier
         max_tokens: Maximum tokens in response (default: 800)
         temperature: Sampling temperature (0-1)
+        json_mode: Constrain the response to a valid JSON object
     
     Returns:
         Generated text response
@@ -106,9 +166,11 @@ def call_groq(
         "temperature": temperature,
         "top_p": 0.95,
     }
+    if json_mode:
+        payload["response_format"] = {"type": "json_object"}
     
     try:
-        resp = requests.post(url, json=payload, headers=headers, timeout=timeout)
+        resp = _http.post(url, json=payload, headers=headers, timeout=timeout)
         
         if resp.status_code == 401:
             raise APIError("Groq API authentication failed. Check your API key.")
@@ -171,7 +233,7 @@ def call_gemini(
     }
     
     try:
-        resp = requests.post(url, json=payload, headers=headers, timeout=timeout)
+        resp = _http.post(url, json=payload, headers=headers, timeout=timeout)
         
         if resp.status_code == 401:
             raise APIError("Gemini API authentication failed. Check your API key.")
@@ -199,6 +261,11 @@ def call_gemini(
         raise APIError(f"Network error calling Gemini API: {str(e)}")
 
 
+def is_greeting(query: str) -> bool:
+    """Check if a query is a plain greeting that needs no document retrieval."""
+    return query.strip().lower() in COMMON_GREETINGS or bool(GREETING_PATTERN.match(query))
+
+
 def format_context(contexts: List[Dict[str, Any]]) -> str:
     """Format context documents for the prompt."""
     formatted = []
@@ -241,16 +308,7 @@ def generate_answer(
     
     context_text = format_context(contexts)
     
-    prompt = f"""Based on the following excerpts from the Nigeria Tax Act 2025, please answer the question.
-
-CONTEXT:
-{context_text}
-
-QUESTION: {query}
-
-Please provide a clear, accurate answer based ONLY on the information provided above. 
-If the context doesn't contain enough information, clearly state that.
-List the source numbers you used at the end of your response."""
+    prompt = ANSWER_PROMPT_TEMPLATE.format(context=context_text, query=query)
 
     errors = []
     
@@ -302,49 +360,32 @@ def verify_answer(
         prefer_grok: Try Groq/Grok first if True
     
     Returns:
-        Dictionary with verification results including score, accuracy, and issues
+        Dictionary with verification results including score, accuracy, and issues.
+        Fallback results (service down or unparseable output) also set an
+        internal "unavailable": True flag, which callers strip before responding.
     """
     context_text = format_context(contexts)
     
-    prompt = f"""Verify the following answer about Nigerian tax law.
-
-CONTEXT DOCUMENTS:
-{context_text}
-
-QUESTION: {query}
-
-ANSWER TO VERIFY:
-{answer}
-
-Analyze the answer and return ONLY a valid JSON object (no markdown, no explanation) with these exact fields:
-{{
-    "score": <float 0-1>,
-    "accurate": <boolean>,
-    "confidence_reason": "<string>",
-    "issues": ["<string>", ...]
-}}"""
+    prompt = VERIFY_PROMPT_TEMPLATE.format(context=context_text, query=query, answer=answer)
 
     try:
         # Try Groq first
         if prefer_grok:
             try:
-                response = call_groq(prompt, system_prompt=VERIFICATION_PROMPT, temperature=0.1)
+                response = call_groq(prompt, system_prompt=VERIFICATION_PROMPT, temperature=0.1, json_mode=True)
             except APIError:
                 response = call_gemini(f"{VERIFICATION_PROMPT}\n\n{prompt}")
         else:
             try:
                 response = call_gemini(f"{VERIFICATION_PROMPT}\n\n{prompt}")
             except APIError:
-                response = call_groq(prompt, system_prompt=VERIFICATION_PROMPT, temperature=0.1)
+                response = call_groq(prompt, system_prompt=VERIFICATION_PROMPT, temperature=0.1, json_mode=True)
         
-        # Parse JSON from response
+        # Groq's JSON mode returns a bare object; Gemini may wrap it in a fence
         response = response.strip()
-        
-        # Handle markdown code blocks
-        if response.startswith("```"):
-            lines = response.split("\n")
-            response = "\n".join(lines[1:-1])
-        
+        fenced = JSON_FENCE_PATTERN.match(response)
+        if fenced:
+            response = fenced.group(1)
         result = json.loads(response)
         
         # Ensure required fields
@@ -361,7 +402,8 @@ Analyze the answer and return ONLY a valid JSON object (no markdown, no explanat
             "score": 0.5,
             "accurate": False,
             "confidence_reason": "Verification response could not be parsed",
-            "issues": ["Verification format error"]
+            "issues": ["Verification format error"],
+            "unavailable": True
         }
     except APIError as e:
         logger.error(f"Verification API error: {e}")
@@ -369,5 +411,6 @@ Analyze the answer and return ONLY a valid JSON object (no markdown, no explanat
             "score": 0,
             "accurate": False,
             "confidence_reason": f"Verification unavailable: {str(e)}",
-            "issues": ["Verification service unavailable"]
+            "issues": ["Verification service unavailable"],
+            "unavailable": True
         }
@@ -6,6 +6,9 @@ import argparse
 import json
 import os
 import pickle
+import threading
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
 
 from dotenv import load_dotenv, dotenv_values
@@ -68,54 +71,86 @@ def load_vectorstore(persist_dir="vectorstore"):
         docs = pickle.load(f)
     logger.info(f"Metadata loaded, {len(docs)} documents")
     
+    # The two files are replaced one after the other, so an interrupted ingest
+    # can pair a new index with old metadata; refuse to serve wrong chunks
+    if index.ntotal != len(docs):
+        raise ValueError(
+            f"Vectorstore mismatch in {persist_dir}: index has {index.ntotal} vectors "
+            f"but metadata has {len(docs)} documents. Re-run scripts/ingest_pdf.py."
+        )
+    
     return index, docs
 
 
-def query(index, docs, q, model_id="sentence-transformers/all-mpnet-base-v2", top_k=5, api_token=None):
-    """Query the vectorstore using local sentence-transformers model."""
+# Metadata fields returned for each search hit
+_result_fields = itemgetter("text", "source", "page", "chunk_id")
+
+# Model cache
+_st_model = None
+_st_model_lock = threading.Lock()
+# The HF fast tokenizer is not thread-safe (concurrent calls can raise
+# "Already borrowed"), so gthread workers serialize encode on the shared model
+_st_encode_lock = threading.Lock()
+
+
+def get_embedding_model(model_id="sentence-transformers/all-mpnet-base-v2", api_token=None):
+    """Load the SentenceTransformer model once per process and reuse it."""
     import logging
     logger = logging.getLogger(__name__)
     
-    # Use local model - HF API doesn't support direct embeddings for sentence-transformers
-    from sentence_transformers import SentenceTransformer
-    
-    # Cache model in module-level variable
     global _st_model
-    if '_st_model' not in globals() or _st_model is None:
-        logger.info(f"Loading SentenceTransformer model: {model_id}")
-        try:
-            # Set HF token for model download if available
-            hf_token = api_token or os.getenv("HF_TOKEN")
-            if hf_token:
-                os.environ["HF_TOKEN"] = hf_token
-            
-            # Use cache folder if set (Docker builds pre-download here)
-            cache_folder = os.getenv("SENTENCE_TRANSFORMERS_HOME")
-            if cache_folder:
-                _st_model = SentenceTransformer(model_id, cache_folder=cache_folder)
-            else:
-                _st_model = SentenceTransformer(model_id)
-            logger.info("Model loaded successfully")
-        except Exception as e:
-            logger.error(f"Failed to load model: {e}")
-            raise
-    
-    emb = _st_model.encode([q], show_progress_bar=False, convert_to_numpy=True)
+    if _st_model is None:
+        with _st_model_lock:
+            if _st_model is None:
+                # Use local model - HF API doesn't support direct embeddings for sentence-transformers
+                from sentence_transformers import SentenceTransformer
+                
+                logger.info(f"Loading SentenceTransformer model: {model_id}")
+                try:
+                    # Set HF token for model download if available
+                    hf_token = api_token or os.getenv("HF_TOKEN")
+                    if hf_token:
+                        os.environ["HF_TOKEN"] = hf_token
+                    
+                    # Use cache folder if set (Docker builds pre-download here)
+                    cache_folder = os.getenv("SENTENCE_TRANSFORMERS_HOME")
+                    if cache_folder:
+                        _st_model = SentenceTransformer(model_id, cache_folder=cache_folder)
+                    else:
+                        _st_model = SentenceTransformer(model_id)
+                    logger.info("Model loaded successfully")
+                except Exception as e:
+                    logger.error(f"Failed to load model: {e}")
+                    raise
+    return _st_model
+
+
+@lru_cache(maxsize=1024)
+def _embed_query(q, model_id):
+    """Embed and L2-normalize a query; repeated questions skip the model entirely."""
+    model = get_embedding_model(model_id)
+    with _st_encode_lock:
+        emb = model.encode([q], show_progress_bar=False, convert_to_numpy=True)
     emb = np.array(emb, dtype=np.float32)
-    emb = emb / (np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12)
+    return emb / (np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12)
+
+
+def query(index, docs, q, model_id="sentence-transformers/all-mpnet-base-v2", top_k=5, api_token=None):
+    """Query the vectorstore using local sentence-transformers model."""
+    # Load with the caller's token (no-op once cached) before the embedding lookup
+    get_embedding_model(model_id, api_token)
+    emb = _embed_query(" ".join(q.split()), model_id)
     
     D, I = index.search(emb, top_k)
     results = []
-    for score, idx in zip(D[0], I[0]):
+    # tolist() converts the numpy scores/ids to Python scalars in one call
+    for score, idx in zip(D[0].tolist(), I[0].tolist()):
         if idx < 0:
             continue
-        meta = docs[idx]
-        results.append({"score": float(score), "text": meta["text"], "source": meta["source"], "page": meta["page"], "chunk_id": meta["chunk_id"]})
+        text, source, page, chunk_id = _result_fields(docs[idx])
+        results.append({"score": score, "text": text, "source": source, "page": page, "chunk_id": chunk_id})
     return results
 
-# Model cache
-_st_model = None
-
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()